@@ -1,19 +1,26 @@
 import os
-from typing import Tuple
+import stat
+import sys
+from typing import Optional, Tuple
 import click
 
-from utils.list_files import list_files as impl_list_files
+from utils.list_files import iter_files, find_repo_root
 from utils.path_trees import paths_to_forest, render as render_tree
 from utils.cli_ctx_helpers import (
+    CtxState,
     set_global_prop,
     get_global_prop,
     resolve_bool_flag,
 )
-from utils.format_file_readout import format_file_readout
+from utils.format_file_readout import write_file_readout
+from utils.text_chunks import sniff_text_chunks
 
 # Default if neither place specifies anything
 DEFAULT_REPO = True
 
+# Section body used for files that are not utf-8 text
+BINARY_PLACEHOLDER = "<binary file or non-utf8 text>"
+
 
 @click.group()
 @click.option(
@@ -28,46 +35,52 @@ def cli(ctx, repo):
     set_global_prop(ctx, "repo", repo)
 
 
-def is_effective_child(parent_dir, child_path):
-    return os.path.normpath(child_path).startswith(
-        os.path.normpath(parent_dir)
-    )
-
-def get_files(effective_repo: bool, included_paths: Tuple[str]):
+def get_repo_root(ctx) -> Optional[str]:
+    """Discover the repo root for the CWD once and share it through the context."""
+    repo_root = get_global_prop(ctx, "repo_root")
+    if repo_root is None:
+        repo_root = find_repo_root(os.getcwd())
+        set_global_prop(ctx, "repo_root", repo_root)
+    return repo_root
+
+
+def get_files(effective_repo: bool, included_paths: Tuple[str], repo_root: Optional[str] = None):
+    """
+    Validate the included paths and return a lazy iterator over the matching files.
+    Argument errors are raised here, before anything is walked or printed.
+    """
+    cwd = os.getcwd()
+    isabs = os.path.isabs
+    join = os.path.join
+    normpath = os.path.normpath
+    os_stat = os.stat
     included_dirs = []
-    explict_included_dirs = []
-    file_filters = []
+    included_files = []
+    seen = set()
 
     for included_path in included_paths:
-        full_path = os.path.normpath(os.path.join(os.getcwd(), included_path))
-        if os.path.isdir(full_path):
-            included_dirs.append(os.path.normpath(included_path))
-            explict_included_dirs.append(os.path.normpath(included_path))
-        if os.path.isfile(full_path):
-            # included_dirs.append(os.path.dirname(full_path))
-            segments = os.path.normpath(included_path).split(os.path.sep)
-            if len(segments) > 1:
-                effective_parent = os.path.join(*segments[:-1])
-                included_dirs.append(effective_parent)
-            else:
-                if "" not in included_dirs:
-                    included_dirs.append("")
-            file_filters.append(os.path.normpath(included_path))
-
-    if any(os.path.isabs(dir_path) for dir_path in included_dirs):
-        raise click.UsageError("Included directory paths must be relative.")
-    
-    files = impl_list_files(os.getcwd(), effective_repo, included_dirs)
-
-    if len(file_filters) > 0:
-        files = [
-            f
-            for f in files
-            if os.path.normpath(f) in file_filters
-            or any(dn and is_effective_child(dn, f) for dn in explict_included_dirs)
-        ]
-
-    return files
+        if isabs(included_path):
+            raise click.UsageError("Included paths must be relative.")
+        # Normalize once; repeated spellings of the same path are only stat'ed once
+        np = normpath(included_path)
+        if np in seen:
+            continue
+        seen.add(np)
+        # One stat answers both "is it a dir" and "is it a file"; missing paths are skipped
+        try:
+            mode = os_stat(normpath(join(cwd, np))).st_mode
+        except (OSError, ValueError):
+            continue
+        if stat.S_ISDIR(mode):
+            included_dirs.append(np)
+        elif stat.S_ISREG(mode):
+            included_files.append(np)
+
+    # The walker prunes to the included dirs and files itself, so nothing outside them
+    # is ever scanned and no post-filter pass is needed
+    return iter_files(
+        cwd, effective_repo, included_dirs, included_files, repo_root=repo_root
+    )
 
 @cli.command()
 @click.option(
@@ -94,18 +107,36 @@ def list_files(ctx, repo_local, tree, included_paths: Tuple[str]):
     )
 
    
-    files = get_files(effective_repo, included_paths)
+    repo_root = get_repo_root(ctx) if effective_repo else None
+    files = get_files(effective_repo, included_paths, repo_root)
 
 
     if not tree:
+        # Stream paths as the walk finds them instead of materializing the whole list
+        write = sys.stdout.write
         for file in files:
-            print(file)
+            write(file + "\n")
     else:
-        forest = paths_to_forest(files, delimiter="/")
+        forest = build_forest(files)
         for t in forest:
             print(render_tree(t))
 
 
+def build_forest(files):
+    """Build the path forest for display from POSIX-style relative paths."""
+    # Sorted, so consecutive paths share their leading segments, which paths_to_forest
+    # reuses instead of re-walking from the root. Plain strings are tokenized in bulk.
+    return paths_to_forest(sorted(files), delimiter="/")
+
+
+def iter_rendered_forest(forest):
+    """Yield the rendered trees of `forest` newline-separated, one tree at a time."""
+    for i, tree in enumerate(forest):
+        if i:
+            yield "\n"
+        yield render_tree(tree)
+
+
 @cli.command()
 @click.option(
     "--repo/--no-repo",
@@ -132,33 +163,49 @@ def collect_files(ctx, repo_local, out_file, included_paths: Tuple[str]):
         false_label="--no-repo",
     )
 
-    files = get_files(effective_repo, included_paths)
-
-    forest = paths_to_forest(files, delimiter="/")
-    file_structure_readout = "\n".join(render_tree(t) for t in forest)
-
-    sections = []
-
-    sections.append(format_file_readout("File Structure", file_structure_readout))
-
-    for file in files:
-        full_path = os.path.join(os.getcwd(), os.path.normpath(file))
-        try:
-            with open(full_path, "r", encoding="utf-8") as f:
-                file_content = f.read()
-        except Exception as e:
-            file_content = "<binary file or non-utf8 text>"
-        sections.append(format_file_readout(file, file_content))
-
-    if not out_file:
-
-        print("\n\n".join(sections))
-
-    else:
-
-        with open(out_file, "w", encoding="utf-8", newline="\n") as f:
-            f.write("\n\n".join(sections))
+    repo_root = get_repo_root(ctx) if effective_repo else None
+    files = list(get_files(effective_repo, included_paths, repo_root))
+
+    cwd = os.getcwd()
+    # Absolute paths, normalized once and reused for the exclusion check and the reads
+    full_paths = [os.path.join(cwd, os.path.normpath(f)) for f in files]
+
+    # Sections are streamed straight into the output file, which is truncated before the
+    # files are read, so the bundle must never collect itself.
+    if out_file:
+        out_path = os.path.normpath(os.path.join(cwd, out_file))
+        if out_path in full_paths:
+            i = full_paths.index(out_path)
+            del files[i], full_paths[i]
+
+    forest = build_forest(files)
+
+    # Stream each section straight to the destination instead of joining the whole
+    # bundle in memory
+    out = open(out_file, "w", encoding="utf-8", newline="\n") if out_file else sys.stdout
+
+    try:
+        write_file_readout(out, "File Structure", iter_rendered_forest(forest))
+
+        for file, full_path in zip(files, full_paths):
+            out.write("\n\n")
+            try:
+                fb = open(full_path, "rb")
+            except OSError:
+                write_file_readout(out, file, [BINARY_PLACEHOLDER])
+                continue
+            with fb:
+                # Only the first few KiB are inspected; text is then streamed chunk-wise
+                chunks = sniff_text_chunks(fb)
+                write_file_readout(out, file, chunks if chunks is not None else [BINARY_PLACEHOLDER])
+
+        if not out_file:
+            # Terminate the stdout bundle with a newline, as print() did
+            out.write("\n")
+    finally:
+        if out_file:
+            out.close()
 
 
 if __name__ == "__main__":
-    cli(obj={})
+    cli(obj=CtxState())
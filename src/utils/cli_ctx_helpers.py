@@ -2,22 +2,42 @@ from typing import Any, Callable, Dict, Optional
 import click
 
 
+class CtxState:
+    """
+    Object stored in ctx.obj to hold global properties. The frequently read ones live
+    in slots (a single attribute read instead of two dict lookups); any other name
+    falls back to the `_extras` dict.
+    """
+    __slots__ = ("repo", "repo_root", "_extras")
+
+    def __init__(self) -> None:
+        self.repo: Any = None
+        self.repo_root: Any = None
+        self._extras: Dict[str, Any] = {}
+
+
 def set_global_prop(ctx: click.Context, name: str, value: Any) -> None:
     """
     Store exactly what the user provided (including None) for a given global property.
     """
-    ctx.ensure_object(dict)
-    globals_dict: Dict[str, Any] = ctx.obj.setdefault("_globals", {})
-    globals_dict[name] = value
+    state = ctx.ensure_object(CtxState)
+    try:
+        setattr(state, name, value)
+    except AttributeError:
+        state._extras[name] = value
 
 
 def get_global_prop(ctx: click.Context, name: str) -> Any:
     """
     Retrieve a previously stored global property (or None if not set).
     """
-    if not ctx.obj or "_globals" not in ctx.obj:
+    state = ctx.find_object(CtxState)
+    if state is None:
         return None
-    return ctx.obj["_globals"].get(name, None)
+    try:
+        return getattr(state, name)
+    except AttributeError:
+        return state._extras.get(name, None)
 
 
 def resolve_prop(
@@ -52,19 +72,18 @@ def resolve_prop(
     Returns:
         The effective resolved value.
     """
-    if (global_value is not None) and (local_value is not None) and (global_value != local_value):
-        fmt = formatter or (lambda v: repr(v))
-        msg = conflict_message or (
-            f"Conflicting {name!r} values: global is {fmt(global_value)}, "
-            f"but subcommand is {fmt(local_value)}."
-        )
-        raise click.UsageError(msg)
-
-    if local_value is not None:
+    # Fast paths first: nothing below allocates unless there is an actual conflict
+    if local_value is None:
+        return default if global_value is None else global_value
+    if global_value is None or global_value == local_value:
         return local_value
-    if global_value is not None:
-        return global_value
-    return default
+
+    fmt = formatter or repr
+    msg = conflict_message or (
+        f"Conflicting {name!r} values: global is {fmt(global_value)}, "
+        f"but subcommand is {fmt(local_value)}."
+    )
+    raise click.UsageError(msg)
 
 
 def resolve_bool_flag(
@@ -80,6 +99,12 @@ def resolve_bool_flag(
     Convenience wrapper for tri-state boolean flags (None/True/False) that uses
     resolve_prop but formats values with flag-like labels (e.g., '--repo'/'--no-repo').
     """
+    # No conflict possible: skip building the formatter and message
+    if local_value is None or global_value is None or local_value == global_value:
+        return resolve_prop(
+            name=name, local_value=local_value, global_value=global_value, default=default
+        )
+
     def _fmt(v: Optional[bool]) -> str:
         if v is None:
             return "unspecified"
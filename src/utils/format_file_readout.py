@@ -1,5 +1,37 @@
+import re
+from functools import lru_cache
+
 READOUT_FORMAT_EXPAND_HEADER=1.5
 
+# \r\n and lone \r, normalized to \n in a single pass
+_NEWLINES_RE = re.compile(r"\r\n?")
+
+
+@lru_cache(maxsize=256)
+def _stars(width):
+    # Only a handful of distinct widths show up in one bundle
+    return "*" * width
+
+
+def _header_lines(name):
+    # Determine header width (at least the name length)
+    raw_width = int(round(READOUT_FORMAT_EXPAND_HEADER * len(name)))
+    width = max(len(name), raw_width)
+
+    # Center the name by left-padding with spaces to the nearest center
+    left_pad = (width - len(name)) // 2
+    return _stars(width), " " * left_pad + name
+
+
+def format_readout_header(name):
+    """
+    Builds just the header part of a readout (see format_file_readout): the star bars
+    around the centered name, followed by one blank line.
+    """
+    stars, name_line = _header_lines(name)
+    return "\n".join((stars, name_line, stars, "", ""))
+
+
 def format_file_readout(name, text):
     """
     Normalizes to \n, strips leading/trailing whitespace,
@@ -20,18 +52,38 @@ def format_file_readout(name, text):
 
     """
     # Normalize newlines and strip outer whitespace of contents
-    normalized = text.replace("\r\n", "\n").replace("\r", "\n").strip()
+    if "\r" in text:
+        text = _NEWLINES_RE.sub("\n", text)
+    normalized = text.strip()
 
-    # Determine header width (at least the name length)
-    raw_width = int(round(READOUT_FORMAT_EXPAND_HEADER * len(name)))
-    width = max(len(name), raw_width)
+    # Assemble final string
+    stars, name_line = _header_lines(name)
+    return "\n".join((stars, name_line, stars, "", normalized))
 
-    # Build star lines
-    stars = "*" * width
 
-    # Center the name by left-padding with spaces to the nearest center
-    left_pad = (width - len(name)) // 2
-    name_line = " " * left_pad + name
+def write_file_readout(out, name, chunks):
+    """
+    Streaming counterpart of format_file_readout: writes the same readout to `out`,
+    consuming the contents chunk by chunk instead of as one string.
 
-    # Assemble final string
-    return f"{stars}\n{name_line}\n{stars}\n\n{normalized}"
+    Chunks must already be \n-normalized (text-mode open() does this). Outer whitespace
+    is stripped like format_file_readout does; trailing whitespace of a chunk is held
+    back until something non-blank follows it.
+    """
+    out.write(format_readout_header(name))
+
+    started = False
+    pending = ""
+    for chunk in chunks:
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        body = chunk.rstrip()
+        if body:
+            out.write(pending)
+            out.write(body)
+            pending = chunk[len(body):]
+        else:
+            pending += chunk
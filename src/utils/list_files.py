@@ -1,211 +1,391 @@
 import os
-from typing import List, Optional, Iterable, Tuple, Set
-from dataclasses import dataclass
-from gitignore_parser import parse_gitignore_str
+import re
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple, Set
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from gitignore_parser import rule_from_pattern
 from pathlib import Path
-import posixpath
-
-
-@dataclass
-class FolderItems:
-    files: List[str]
-    folders: List[str]
-    fileSymlinks: List[str]
-    folderSymlinks: List[str]
-    # Hardlinks not need tracked as will operate as normal files or folders
-
-
-def get_folder_items(dirpath: str) -> FolderItems:
-    files = []
-    folders = []
-    fileSymlinks = []
-    folderSymlinks = []
-
-    with os.scandir(dirpath) as it:
-        for entry in it:
-
-            # Check symlinks first (is_dir/is_file follow links by default)
-            if entry.is_symlink():
-                if entry.is_dir(follow_symlinks=True):
-                    folderSymlinks.append(entry.name)
-                elif entry.is_file(follow_symlinks=True):
-                    fileSymlinks.append(entry.name)
-                else:
-                    # Broken symlink — keep with fileSymlinks
-                    fileSymlinks.append(entry.name)
-                continue
-
-            # Regular files/dirs (not symlinks)
-            if entry.is_file(follow_symlinks=False):
-                files.append(entry.name)
-            elif entry.is_dir(follow_symlinks=False):
-                folders.append(entry.name)
-            else:
-                # Special files (sockets, fifos, devices) are ignored here
-                pass
-
-    return FolderItems(files, folders, fileSymlinks, folderSymlinks)
-
-
-# --- New helper --------------------------------------------------------------
-# Expand a list of *relative* directories (relative to CWD) into (a) the original
-# leaves, and (b) the union of those leaves plus all ancestor directories needed
-# to reach them.
-# Example: ["src/app", "tests/unit"] ->
-#   leaves={"src/app", "tests/unit"}
-#   expanded={"src", "src/app", "tests", "tests/unit"}
-
-def expand_with_ancestors(rel_dirs: Iterable[str]) -> Tuple[Set[str], Set[str]]:
-    leaves: Set[str] = set()
-    expanded: Set[str] = set()
-    for d in rel_dirs:
-        if not d:
-            continue
-        # Normalize and keep as POSIX-like relative strings (no leading ./)
-        norm = os.path.normpath(d)
-        if norm in (".", ""):
-            # Including "." means unrestricted; represent it as empty sets handled by caller
-            return set(), set()
-        leaves.add(norm)
-        parts = []
-        for part in Path(norm).parts:
-            parts.append(part)
-            expanded.add(os.path.join(*parts))
-    return leaves, expanded
-
-
-def list_files(dirpath: str, repo: bool, included_dirs=tuple()) -> List[str]:
+
+# Hand the walk to a thread pool once this many directories are pending. Workers spend
+# most of their time blocked in scandir/open syscalls, so the GIL is not the bottleneck;
+# below the threshold (tiny trees) the pool startup would cost more than it saves.
+PARALLEL_WALK_THRESHOLD = 4
+PARALLEL_WALK_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Upper bound on directories scanned ahead of the consumer (submitted but not yet
+# yielded), which bounds the memory held by a parallel walk
+PARALLEL_WALK_AHEAD = PARALLEL_WALK_WORKERS * 2
+
+
+@lru_cache(maxsize=4096)
+def ancestors_of(path: str) -> FrozenSet[str]:
+    """`path` itself and every directory above it (pure string work, memoized)."""
+    out = {path}
+    parent = os.path.dirname(path)
+    while parent != path:
+        out.add(parent)
+        path, parent = parent, os.path.dirname(parent)
+    return frozenset(out)
+
+
+def compile_gitignore(gitignore_text: str, base_dir: str) -> Optional[Callable[[str], bool]]:
     """
-    List files under `dirpath`, honoring .gitignore rules.
+    Compile .gitignore text into a single predicate over absolute paths under `base_dir`.
 
-    If repo=True, walk from the repo root (dir containing .git) so top-level ignores apply,
-    BUT only traverse toward `dirpath` and within its subtree. Results are reported
-    relative to `dirpath`.
+    Each rule's glob is translated to a regex by gitignore_parser, then runs of consecutive
+    rules with the same polarity are OR-ed into one compiled pattern. A path is tested with
+    one regex search per run (in C) instead of one Python-level call per rule. Runs are
+    checked last-to-first and the first hit decides, matching git's "later rules override
+    earlier ones" semantics for negations.
 
-    If included_dirs is non-empty, restrict traversal to the union of those dirs *and
-    their ancestors*, but only accept files that live within the original (leaf) dirs.
-    This avoids prematurely pruning DFS branches while still returning only leaf hits.
-    `included_dirs` entries are treated as paths relative to the current working dir.
+    Returns None if the text contains no rules.
     """
-    dirpath_p = Path(dirpath).resolve()
+    runs: List[Tuple[bool, List[str]]] = []
+    for line in gitignore_text.splitlines():
+        rule = rule_from_pattern(line)
+        if rule is None:
+            continue
+        if runs and runs[-1][0] == rule.negation:
+            runs[-1][1].append(rule.regex)
+        else:
+            runs.append((rule.negation, [rule.regex]))
 
-    # Normalize included_dirs relative to CWD
-    cwd_p = Path.cwd().resolve()
-    included_dirs = tuple(os.path.normpath(d) for d in included_dirs)
+    if not runs:
+        return None
 
-    # Build (leaf, expanded-with-ancestors) rel-path sets
-    leaf_rel, expanded_rel = expand_with_ancestors(included_dirs)
+    compiled = [
+        (negation, re.compile("|".join(f"(?:{frag})" for frag in frags)))
+        for negation, frags in reversed(runs)
+    ]
 
-    # Convert to absolute Path sets (resolved from CWD)
-    leaf_abs: Set[Path] = set((cwd_p / p).resolve() for p in leaf_rel) if leaf_rel else set()
-    expanded_abs: Set[Path] = set((cwd_p / p).resolve() for p in expanded_rel) if expanded_rel else set()
+    # Rules match against the path relative to the .gitignore's directory
+    prefix_len = len(base_dir) if base_dir.endswith(os.sep) else len(base_dir) + 1
 
-    # --- Find repo root if requested
-    repo_root: Optional[Path] = None
-    if repo:
-        p = dirpath_p
-        while True:
-            if (p / ".git").exists():  # works for .git folder or file
-                repo_root = p
-                break
-            if p.parent == p:
-                # reached filesystem root
-                break
-            p = p.parent
-
-    # Where to start recursion for .gitignore propagation:
-    search_root = repo_root if (repo and repo_root is not None) else dirpath_p
-
-    # Helper path predicates (avoid Path.is_relative_to for 3.8 compatibility)
-    def is_within(child: Path, parent: Path) -> bool:
-        try:
-            child.relative_to(parent)
-            return True
-        except ValueError:
-            return False
+    if len(compiled) == 1 and not compiled[0][0]:
+        # Common case: no negations, the whole file is one pattern
+        search = compiled[0][1].search
+        return lambda abs_path: search(abs_path[prefix_len:]) is not None
 
-    # Membership checks -------------------------------------------------------
-    def in_expanded(p: Path) -> bool:
-        if not expanded_abs:
-            return True  # no restriction
-        return any(is_within(p, inc) for inc in expanded_abs)
-
-    def in_leaf(p: Path) -> bool:
-        if not leaf_abs:
-            return True  # no restriction (mirrors previous behavior when included_dirs empty)
-        return any(is_within(p, inc) for inc in leaf_abs)
-
-    # Only traverse needed subtrees (repo constraint) + allow ancestors for included
-    def should_descend(next_dir: Path) -> bool:
-        ok_repo = True
-        if repo and repo_root is not None:
-            ok_repo = is_within(dirpath_p, next_dir) or is_within(next_dir, dirpath_p)
-
-        ok_included = True
-        if expanded_abs:  # use expanded to keep walking down toward leaves
-            ok_included = any(
-                is_within(inc, next_dir) or  # next_dir is an ancestor of an included leaf
-                is_within(next_dir, inc)     # already within an included leaf subtree
-                for inc in expanded_abs
-            )
-        return ok_repo and ok_included
-
-    # Default reject — streamlined: enforce .git and expanded restriction globally
-    def default_reject_fn(f: str) -> bool:
-        p = Path(f).resolve()
-        if p.name == ".git":
-            return True
-        # Allow ancestors to remain traversable, but still restrict to expanded set
-        if not in_expanded(p):
-            return True
+    def match(abs_path: str) -> bool:
+        rel_path = abs_path[prefix_len:]
+        for negation, pattern in compiled:
+            if pattern.search(rel_path) is not None:
+                return not negation
         return False
 
-    result: List[str] = []
+    return match
 
-    def recursion(current_dirpath: str, last_fn=default_reject_fn):
-        folder_items = get_folder_items(current_dirpath)
-        files = folder_items.files
-        folders = folder_items.folders
 
-        # Compose .gitignore rules for this directory
-        gitignore_path = os.path.join(current_dirpath, ".gitignore")
-        if ".gitignore" not in folder_items.files:
-            particular_reject_fn = default_reject_fn
-        else:
-            with open(gitignore_path, "r", encoding="utf-8", errors="ignore") as f:
-                gitignore_text = f.read()
-            particular_reject_fn = parse_gitignore_str(gitignore_text, base_dir=current_dirpath)
+# --- Compiled .gitignore cache ------------------------------------------------
+# Parsed matchers keyed by (absolute .gitignore path, mtime_ns). Sibling walks and
+# repeated list_files calls in the same process reuse the compiled predicate; an edit
+# bumps the mtime and so naturally misses the cache. Bounded, and safe to share
+# between the walker threads.
+@lru_cache(maxsize=4096)
+def _load_gitignore(gitignore_path: str, mtime_ns: int) -> Optional[Callable[[str], bool]]:
+    # mtime_ns is only part of the cache key
+    with open(gitignore_path, "rb") as f:
+        gitignore_text = f.read().decode("utf-8", "ignore")
+    return compile_gitignore(gitignore_text, os.path.dirname(gitignore_path))
 
-        reject_fn = lambda f: last_fn(f) or particular_reject_fn(f)
 
-        # Files: accept only within dirpath subtree (repo) AND within *leaf* set
-        for file in files:
-            abs_file = Path(current_dirpath, file).resolve()
-            if not reject_fn(str(abs_file)):
-                if (not (repo and repo_root is not None) or is_within(abs_file, dirpath_p)) and in_leaf(abs_file):
-                    result.append(str(abs_file))
+def load_gitignore_matcher(dirpath: str) -> Optional[Callable[[str], bool]]:
+    """
+    Return the (cached) matcher for `dirpath`/.gitignore, or None if there is none.
+    """
+    gitignore_path = os.path.join(dirpath, ".gitignore")
+    # A cache hit costs a single stat; the file is only opened and parsed on a miss
+    try:
+        return _load_gitignore(gitignore_path, os.stat(gitignore_path).st_mtime_ns)
+    except (FileNotFoundError, IsADirectoryError):
+        return None
 
-        # Folders: descend selectively (repo mode + included expanded)
-        for folder in folders:
-            next_dir = Path(current_dirpath, folder).resolve()
-            if reject_fn(str(next_dir)):
-                continue
-            if should_descend(next_dir):
-                recursion(str(next_dir), reject_fn)
 
-    # If expanded set exists and doesn't intersect search_root, bail early
-    if expanded_abs:
-        intersects = any(is_within(inc, search_root) or is_within(search_root, inc) for inc in expanded_abs)
-        if not intersects:
-            return []
+# --- Repo root discovery -------------------------------------------------------
+# Memoized per process, keyed by the dirpath as given: listing and collecting in one
+# run (or repeated calls from a long-lived process) only walk up the ancestors once.
+_REPO_ROOT_CACHE: Dict[str, Optional[str]] = {}
 
-    recursion(str(search_root))
 
-    # Present results relative to the original dirpath
-    result = [os.path.relpath(f, str(dirpath_p)) for f in result]
+def find_repo_root(dirpath: str) -> Optional[str]:
+    """
+    Return the resolved path of the nearest directory at or above `dirpath` that
+    contains a .git folder or file, or None if there is none.
+    """
+    if dirpath in _REPO_ROOT_CACHE:
+        return _REPO_ROOT_CACHE[dirpath]
+
+    repo_root: Optional[str] = None
+    p = str(Path(dirpath).resolve())
+    while True:
+        # Common case: .git right here, so this is a single stat
+        if os.path.exists(os.path.join(p, ".git")):  # works for .git folder or file
+            repo_root = p
+            break
+        parent = os.path.dirname(p)
+        if parent == p:
+            # reached filesystem root
+            break
+        p = parent
+
+    _REPO_ROOT_CACHE[dirpath] = repo_root
+    return repo_root
+
+
+def iter_files(
+    dirpath: str,
+    repo: bool,
+    included_dirs=tuple(),
+    included_files=tuple(),
+    repo_root: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Lazily yield files under `dirpath`, honoring .gitignore rules, as they are found.
+
+    If repo=True, walk from the repo root (dir containing .git) so top-level ignores apply,
+    BUT only traverse toward `dirpath` and within its subtree. Results are reported
+    relative to `dirpath`.
+
+    If included_dirs / included_files are non-empty, only accept files that live within
+    one of the included (leaf) dirs or are one of the included files. Traversal is pruned
+    to those dirs, the parents of those files, and their ancestors, so a single requested
+    file never costs a walk of its whole parent subtree. An included dir of "." lifts
+    the restriction. Entries are treated as paths relative to the current working dir.
+
+    `repo_root` may be passed in when the caller already discovered it (see
+    find_repo_root); otherwise it is looked up when repo=True.
+
+    Paths are POSIX-style and relative to `dirpath`, in walk order.
+    """
+    # Resolved once; everything below is plain string work on this and scandir's paths
+    dirpath_str = str(Path(dirpath).resolve())
 
-    result = [os.path.normpath(f) for f in result]  # Just in case
+    # Helper path predicates. Everything below works on normalized absolute path strings
+    # (search_root is resolved once and scandir joins names onto it), so containment is
+    # a plain prefix test: no Path allocation, no resolve(), no ValueError round-trip.
+    sep = os.sep
 
-    result = [f.replace("\\", "/") for f in result]  # Normalize to POSX-style paths
+    def as_prefix(p: str) -> str:
+        return p if p.endswith(sep) else p + sep
 
-    return result
+    def is_within(child: str, parent: str, parent_prefix: str) -> bool:
+        return child == parent or child.startswith(parent_prefix)
+
+    # Included paths are relative to CWD. Each one is normalized and resolved exactly
+    # once; the ancestors needed to reach it are then derived from the resolved string,
+    # so they never need resolving themselves.
+    included_dirs = tuple(os.path.normpath(d) for d in included_dirs)
+    included_files = tuple(os.path.normpath(f) for f in included_files)
+    if os.curdir in included_dirs:
+        included_dirs, included_files = (), ()
+
+    cwd_str = os.getcwd()
+    realpath = os.path.realpath
+    join = os.path.join
+    leaf_set = frozenset(realpath(join(cwd_str, d)) for d in included_dirs)
+    # Resolve only the parent so a symlinked file is not swapped for its target
+    file_set = frozenset(
+        join(realpath(join(cwd_str, os.path.dirname(f))), os.path.basename(f))
+        for f in included_files
+    )
+    leaf_strs = [(s, as_prefix(s)) for s in leaf_set]
+    restricted = bool(leaf_set or file_set)
+
+    # --- Find repo root if requested
+    if repo and repo_root is None:
+        repo_root = find_repo_root(dirpath_str)
+
+    # Where to start recursion for .gitignore propagation (repo_root is already resolved):
+    search_root_str = repo_root if (repo and repo_root is not None) else dirpath_str
+    restrict_to_dirpath = repo and repo_root is not None
+
+    # Membership checks -------------------------------------------------------
+    # Each work item carries two flags instead of re-testing its path against every
+    # included dir: in_leaf (within an included leaf dir, or nothing is included) and
+    # in_dirpath (within dirpath, or no repo restriction). A child inherits a flag that
+    # is already set, and otherwise only needs one hash lookup to see if it is exactly
+    # the boundary. Directories that are not inside may still lie on the way to one,
+    # which is again a hash lookup against these precomputed ancestor sets:
+    dirpath_ancestors = ancestors_of(dirpath_str)
+    # included dirs / file parents and their ancestors. Parents of included files are
+    # only traversed, never accepted wholesale, so they are not leaves.
+    toward_included: Set[str] = set()
+    for s in leaf_set:
+        toward_included |= ancestors_of(s)
+    for f in file_set:
+        toward_included |= ancestors_of(os.path.dirname(f))
+
+    # Scan one directory: returns its accepted files and the work items to descend into.
+    # Each item carries the stack of matchers inherited from its parent (one per
+    # .gitignore on the way down) and the in_leaf / in_dirpath flags.
+    def scan_dir(current_dirpath: str, matchers: List[Callable[[str], bool]], in_leaf: bool, in_dirpath: bool):
+        # Classify entries in one pass over the listing. DirEntry caches the d_type from
+        # readdir, so this rarely needs a stat; symlinks are neither listed nor followed,
+        # and special files (sockets, fifos, devices) are ignored.
+        # A .gitignore is spotted here too, instead of probing every directory for one
+        # with a separate full-path stat.
+        # Entries are routed as they come: flag and set checks that don't depend on this
+        # directory's .gitignore run right away, so paths that can never be accepted or
+        # descended into are not collected at all. Only the matcher test has to wait
+        # for the whole listing, since the .gitignore may show up after other entries.
+        take_all_files = in_dirpath and in_leaf
+        take_some_files = in_dirpath and not in_leaf and bool(file_set)
+        file_paths: List[str] = []
+        dir_items: List[Tuple[str, bool, bool]] = []
+        has_gitignore = False
+        with os.scandir(current_dirpath) as it:
+            for entry in it:
+                name = entry.name
+                if name == ".git":
+                    continue
+                if entry.is_file(follow_symlinks=False):
+                    if name == ".gitignore":
+                        has_gitignore = True
+                    # Files: accept only within dirpath subtree (repo) AND within the
+                    # included set. A file is within a leaf dir exactly when its directory is.
+                    if take_all_files:
+                        file_paths.append(entry.path)
+                    elif take_some_files:
+                        p = entry.path
+                        if p in file_set:
+                            file_paths.append(p)
+                elif entry.is_dir(follow_symlinks=False):
+                    # Folders: descend selectively (repo mode + included expanded)
+                    p = entry.path
+                    child_in_dirpath = in_dirpath or p == dirpath_str
+                    if not (child_in_dirpath or p in dirpath_ancestors):
+                        continue
+                    child_in_leaf = in_leaf or p in leaf_set
+                    if not (child_in_leaf or p in toward_included):
+                        continue
+                    dir_items.append((p, child_in_leaf, child_in_dirpath))
+
+        # Only allocate a new stack when this directory adds rules; otherwise the
+        # parent's list is shared by reference.
+        if has_gitignore:
+            particular_reject_fn = load_gitignore_matcher(current_dirpath)
+            if particular_reject_fn is not None:
+                matchers = matchers + [particular_reject_fn]
+
+        if not matchers:
+            return file_paths, [(p, matchers, l, d) for p, l, d in dir_items]
+        files = [p for p in file_paths if not any(m(p) for m in matchers)]
+        subdirs = [
+            (p, matchers, l, d) for p, l, d in dir_items if not any(m(p) for m in matchers)
+        ]
+        return files, subdirs
+
+    # Iterative DFS. Children are pushed in reverse so they pop in scandir order, which
+    # keeps the same output order as a recursive walk (files of a dir, then its subdirs).
+    def walk(root_item):
+        worklist = deque([root_item])
+        while worklist:
+            if len(worklist) > PARALLEL_WALK_THRESHOLD:
+                yield from walk_parallel(worklist)
+                return
+            files, subdirs = scan_dir(*worklist.pop())
+            yield from files
+            worklist.extend(reversed(subdirs))
+
+    # Same traversal, but the directories next in DFS order are scanned ahead by pool
+    # workers. The consumer keeps at most PARALLEL_WALK_AHEAD scans submitted and not yet
+    # consumed, so a slow consumer (e.g. a blocked stdout) holds a bounded number of
+    # directory listings in memory, and workers never block waiting on it. The output
+    # order is unchanged. If the consumer stops early, scans not yet started are cancelled.
+    def walk_parallel(worklist):
+        with ThreadPoolExecutor(max_workers=PARALLEL_WALK_WORKERS) as pool:
+            # Slots are [item, future or None]; the right end is the top of the DFS stack
+            stack = deque([item, None] for item in worklist)
+            in_flight = 0
+            try:
+                while stack:
+                    # Top up from the top of the stack, so the directories needed next are
+                    # submitted first. The top slot itself is always submitted here.
+                    for slot in reversed(stack):
+                        if in_flight >= PARALLEL_WALK_AHEAD:
+                            break
+                        if slot[1] is None:
+                            slot[1] = pool.submit(scan_dir, *slot[0])
+                            in_flight += 1
+                    _, future = stack.pop()
+                    in_flight -= 1
+                    files, subdirs = future.result()
+                    yield from files
+                    stack.extend([sub, None] for sub in reversed(subdirs))
+            finally:
+                for _, future in stack:
+                    if future is not None:
+                        future.cancel()
+
+    # Narrow the walk to where files can actually be accepted: inside dirpath and, if
+    # restricted, inside an included leaf dir or the parent of an included file. Included
+    # paths elsewhere are dropped here, and the walk starts at the deepest directory
+    # common to what is left instead of at search_root.
+    dirpath_prefix = as_prefix(dirpath_str)
+    if restricted:
+        targets = []
+        for leaf, leaf_prefix in leaf_strs:
+            if is_within(leaf, dirpath_str, dirpath_prefix):
+                targets.append(leaf)
+            elif is_within(dirpath_str, leaf, leaf_prefix):
+                targets.append(dirpath_str)
+        for f in file_set:
+            parent = os.path.dirname(f)
+            if is_within(parent, dirpath_str, dirpath_prefix):
+                targets.append(parent)
+        if not targets:
+            return
+        start_dir = os.path.commonpath(targets)
+    else:
+        start_dir = dirpath_str
+    if not os.path.isdir(start_dir):
+        return
+
+    # The directories skipped between search_root and start_dir still contribute their
+    # .gitignore rules, and can themselves be ignored, exactly as if they had been walked.
+    # (start_dir is within dirpath, which is within search_root.)
+    matchers: List[Callable[[str], bool]] = []
+    if start_dir != search_root_str:
+        current = search_root_str
+        for name in start_dir[len(as_prefix(search_root_str)):].split(sep):
+            # scan_dir only reads a .gitignore that is a regular file, not a symlink
+            if not os.path.islink(os.path.join(current, ".gitignore")):
+                particular_reject_fn = load_gitignore_matcher(current)
+                if particular_reject_fn is not None:
+                    matchers = matchers + [particular_reject_fn]
+            current = os.path.join(current, name)
+            if name == ".git" or any(m(current) for m in matchers):
+                return
+
+    root_in_leaf = not restricted or any(
+        is_within(start_dir, leaf, leaf_prefix) for leaf, leaf_prefix in leaf_strs
+    )
+    root_in_dirpath = not restrict_to_dirpath or is_within(start_dir, dirpath_str, dirpath_prefix)
+
+    # Every accepted file lies under dirpath (in_dirpath is required in repo mode, and
+    # otherwise the walk starts there), and scandir paths never contain "." or ".."
+    # segments, so making them relative is a slice rather than relpath + normpath.
+    prefix_len = len(dirpath_prefix)
+    files = walk((start_dir, matchers, root_in_leaf, root_in_dirpath))
+    # Present results relative to the original dirpath, normalized to POSIX-style paths.
+    # On POSIX they already are, and a backslash there is part of a file name.
+    if sep == "/":
+        for f in files:
+            yield f[prefix_len:]
+    else:
+        for f in files:
+            yield f[prefix_len:].replace(sep, "/")
+
+
+def list_files(
+    dirpath: str,
+    repo: bool,
+    included_dirs=tuple(),
+    included_files=tuple(),
+    repo_root: Optional[str] = None,
+) -> List[str]:
+    """
+    List files under `dirpath`, honoring .gitignore rules. Eager form of iter_files,
+    see there for the parameters.
+    """
+    return list(iter_files(dirpath, repo, included_dirs, included_files, repo_root=repo_root))
@@ -1,24 +1,40 @@
-from dataclasses import dataclass, field
-from typing import List, Dict, Iterable, Callable, Tuple, Union
+import sys
+from typing import List, Dict, Iterable, Callable, Optional, Tuple, Union
 
 PathLike = Union[str, Iterable[str]]
 
-@dataclass
 class Node:
-    name: str
-    children: Dict[str, "Node"] = field(default_factory=dict)
-    # Whether at least one input path ends exactly at this node
-    terminal: bool = False
-
-    def add(self, segments: List[str]):
-        if not segments:
-            self.terminal = True
-            return
-        head, *tail = segments
-        child = self.children.get(head)
-        if child is None:
-            child = self.children[head] = Node(head)
-        child.add(tail)
+    # Slotted (no per-node __dict__): a large file tree has one Node per file and folder.
+    # Written out by hand since dataclass(slots=True) needs Python 3.10.
+    __slots__ = ("name", "children", "terminal")
+
+    def __init__(self, name: str, children: Optional[Dict[str, "Node"]] = None, terminal: bool = False):
+        self.name = name
+        self.children: Dict[str, "Node"] = {} if children is None else children
+        # Whether at least one input path ends exactly at this node
+        self.terminal = terminal
+
+    def __repr__(self):
+        return f"Node(name={self.name!r}, children={self.children!r}, terminal={self.terminal!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Node):
+            return NotImplemented
+        return (self.name, self.children, self.terminal) == (other.name, other.children, other.terminal)
+
+    def add(self, segments: Iterable[str]):
+        # Iterative so deep paths cost neither a call frame nor a tail copy per segment
+        intern = sys.intern
+        node = self
+        for seg in segments:
+            child = node.children.get(seg)
+            if child is None:
+                seg = intern(seg)
+                child = node.children[seg] = Node(seg)
+            node = child
+        node.terminal = True
+
+_NO_TOKEN = object()
 
 def default_split(
     p: PathLike, delimiter: str = "/"
@@ -37,24 +53,53 @@ def default_split(
         if p.startswith(delimiter):
             # absolute: root is the delimiter itself; strip *one* leading delimiter
             body = p[len(delimiter):]
-            segs = [s for s in body.split(delimiter) if s]
-            return (delimiter, segs)
+            return (delimiter, list(filter(None, body.split(delimiter))))
         else:
-            segs = [s for s in p.split(delimiter) if s]
+            segs = list(filter(None, p.split(delimiter)))
             if not segs:
                 return ("", [])
             return (segs[0], segs[1:])
     else:
-        # iterable of tokens
-        tokens = list(p)
-        if not tokens:
+        # iterable of tokens: take the head off the iterator, so the rest is copied once
+        it = iter(p)
+        first = next(it, _NO_TOKEN)
+        if first is _NO_TOKEN:
             return ("", [])
-        if tokens[0] == delimiter:
-            return (delimiter, tokens[1:])
-        return (tokens[0], tokens[1:])
+        return (first, list(it))
+
+def bulk_split(
+    paths: List[str], delimiter: str = "/"
+) -> Tuple[List[str], List[List[str]]]:
+    """
+    default_split for a whole list of string paths at once.
+
+    Returns (root_labels, segment_lists), index-aligned with `paths`. Empty tokens (from
+    a leading, trailing or doubled delimiter) are only filtered out of the paths that
+    actually have them; clean relative paths cost a single str.split.
+    """
+    labels: List[str] = []
+    seg_lists: List[List[str]] = []
+    add_label = labels.append
+    add_segs = seg_lists.append
+    for p in paths:
+        tokens = p.split(delimiter)
+        if "" in tokens:
+            if not p:
+                add_label("")
+                add_segs([])
+                continue
+            absolute = p.startswith(delimiter)
+            tokens = list(filter(None, tokens))
+            if absolute:
+                add_label(delimiter)
+                add_segs(tokens)
+                continue
+        add_label(tokens[0])
+        add_segs(tokens[1:])
+    return labels, seg_lists
 
 def paths_to_forest(
-    paths: List[PathLike],
+    paths: Iterable[PathLike],
     *,
     splitter: Callable[[PathLike], Tuple[str, List[str]]] = None,
     delimiter: str = "/"
@@ -62,18 +107,57 @@ def paths_to_forest(
     """
     Build a forest (list of root Nodes). Roots are determined by the splitter’s
     root_label. All nodes are pure token-based (no filesystem calls).
+
+    Consecutive paths that share a leading run of segments reuse the node chain of the
+    previous path, so for sorted input only the differing tail is looked up and
+    inserted. Paths may also be given pre-split as token sequences (see default_split).
     """
-    if splitter is None:
-        splitter = lambda p: default_split(p, delimiter=delimiter)
+    # The type check below is a separate pass, so one-shot iterators are taken in first
+    if not isinstance(paths, list):
+        paths = list(paths)
+    if splitter is None and all(isinstance(p, str) for p in paths):
+        # Plain string paths: tokenize them all up front, no per-path splitter dispatch
+        split_paths = zip(*bulk_split(paths, delimiter=delimiter))
+    else:
+        if splitter is None:
+            splitter = lambda p: default_split(p, delimiter=delimiter)
+        split_paths = map(splitter, paths)
+
+    intern = sys.intern
 
     # Group by root_label
     roots: Dict[str, Node] = {}
 
-    for p in paths:
-        root_label, segs = splitter(p)
-        if root_label not in roots:
-            roots[root_label] = Node(root_label or "<root>")  # name tweak for empty root
-        roots[root_label].add(segs)
+    last_label = None
+    last_segs: List[str] = []
+    chain: List[Node] = []  # chain[i] is the node reached after i segments of last_segs
+
+    for root_label, segs in split_paths:
+        if root_label == last_label:
+            # Skip the segments shared with the previous path
+            k = 0
+            limit = min(len(segs), len(last_segs))
+            while k < limit and segs[k] == last_segs[k]:
+                k += 1
+            del chain[k + 1:]
+        else:
+            if root_label not in roots:
+                roots[root_label] = Node(root_label or "<root>")  # name tweak for empty root
+            chain = [roots[root_label]]
+            k = 0
+
+        node = chain[-1]
+        for seg in segs[k:]:
+            child = node.children.get(seg)
+            if child is None:
+                # Names like "src" or "__init__.py" repeat all over a tree; share one string
+                seg = intern(seg)
+                child = node.children[seg] = Node(seg)
+            chain.append(child)
+            node = child
+        node.terminal = True
+
+        last_label, last_segs = root_label, segs
 
     # Return a stable list (sorted by root name); drop if you prefer insertion order
     return [roots[k] for k in sorted(roots.keys())]
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
-from subprocess import Popen, PIPE
-from typing import Optional, List, Union, Callable
+from functools import lru_cache
+from subprocess import Popen, PIPE, run
+from threading import Lock
+from typing import Dict, Optional, List, Tuple, Union, Callable
 import os, shutil
 
 
@@ -33,19 +35,105 @@ def run_process(
     Returns:
         RunResult with stdout, stderr, exit_code, and .ok convenience property.
     """
-    # Ensure pipes are set up
-    popen_kwargs.setdefault("stdout", PIPE)
-    popen_kwargs.setdefault("stderr", PIPE)
-    if input is not None:
-        popen_kwargs.setdefault("stdin", PIPE)
+    if input is None and not popen_kwargs:
+        # Common case (e.g. run_git(["status", "--porcelain"])): nothing to feed and no
+        # overrides, so skip the kwargs merging and let run() take its no-input path
+        completed = run(cmd, stdout=PIPE, stderr=PIPE, text=text)
+    else:
+        # Ensure pipes are set up (subprocess.run adds the stdin pipe itself when input is given)
+        popen_kwargs.setdefault("stdout", PIPE)
+        popen_kwargs.setdefault("stderr", PIPE)
+        completed = run(cmd, input=input, text=text, check=False, **popen_kwargs)
+    return RunResult(
+        stdout=completed.stdout or "",
+        stderr=completed.stderr or "",
+        exit_code=completed.returncode,
+    )
 
-    with Popen(cmd, **popen_kwargs, text=text) as proc:
-        stdout, stderr = proc.communicate(input=input)
-        return RunResult(
-            stdout=stdout or "",
-            stderr=stderr or "",
-            exit_code=proc.returncode,
-        )
+
+@lru_cache(maxsize=None)
+def resolve_executable(executable: str) -> str:
+    """
+    Resolves a non-absolute executable with shutil.which(), once per name per process.
+    Raises FileNotFoundError if not found.
+    """
+    if os.path.isabs(executable):
+        return executable
+    resolved = shutil.which(executable)
+    if resolved is None:
+        raise FileNotFoundError(f"Executable '{executable}' not found in PATH")
+    return resolved
+
+
+class StdinLoopRunner:
+    """
+    Drives long-lived processes that answer queries written to their stdin line by line,
+    like `git cat-file --batch-check` or `git check-ignore --stdin -n -v`. One process is
+    started per distinct args and reused, so N queries cost one fork/exec instead of N.
+
+    The command must answer every input line (or end each answer with `sentinel`).
+    A command that stays silent for some inputs, such as plain `git check-ignore --stdin`
+    for a path that isn't ignored, makes the call block forever.
+
+    Calling the runner writes `line` to the process and reads back its answer: a single
+    output line by default, or every line up to (not including) `sentinel` if given.
+    Returned text has the trailing newline(s) removed.
+    """
+
+    def __init__(self, executable: str, **popen_kwargs):
+        self.executable = executable
+        self.popen_kwargs = popen_kwargs
+        self._procs: Dict[Tuple[str, ...], Tuple[Popen, Lock]] = {}
+        self._procs_lock = Lock()
+
+    def _get_proc(self, args: Tuple[str, ...]) -> Tuple[Popen, Lock]:
+        with self._procs_lock:
+            entry = self._procs.get(args)
+            if entry is None or entry[0].poll() is not None:
+                proc = Popen(
+                    [self.executable, *args],
+                    stdin=PIPE,
+                    stdout=PIPE,
+                    text=True,
+                    bufsize=1,  # line buffered, so each query reaches the process at once
+                    **self.popen_kwargs,
+                )
+                entry = self._procs[args] = (proc, Lock())
+            return entry
+
+    def __call__(self, args: Union[str, List[str]], line: str, sentinel: Optional[str] = None) -> str:
+        args = (args,) if isinstance(args, str) else tuple(args)
+        proc, lock = self._get_proc(args)
+        with lock:
+            proc.stdin.write(line + "\n")
+            proc.stdin.flush()
+            if sentinel is None:
+                return proc.stdout.readline().rstrip("\n")
+            lines = []
+            for out_line in proc.stdout:
+                out_line = out_line.rstrip("\n")
+                if out_line == sentinel:
+                    break
+                lines.append(out_line)
+            return "\n".join(lines)
+
+    def close(self):
+        """Closes stdin of every process and waits for them to exit."""
+        with self._procs_lock:
+            procs, self._procs = self._procs, {}
+        for proc, _ in procs.values():
+            proc.stdin.close()
+            proc.wait()
+            proc.stdout.close()
+
+
+def make_stdin_loop_runner(executable: str) -> StdinLoopRunner:
+    """
+    Returns a StdinLoopRunner for the given executable: called as runner(args, line), it
+    queries a kept-alive process rather than spawning one per call. The executable is
+    resolved like in make_runner. Call close() on it when done.
+    """
+    return StdinLoopRunner(resolve_executable(executable))
 
 
 def make_runner(executable: str) -> Callable[..., RunResult]:
@@ -56,11 +144,7 @@ def make_runner(executable: str) -> Callable[..., RunResult]:
     """
 
     # Resolve executable path
-    if not os.path.isabs(executable):
-        resolved = shutil.which(executable)
-        if resolved is None:
-            raise FileNotFoundError(f"Executable '{executable}' not found in PATH")
-        executable = resolved
+    executable = resolve_executable(executable)
 
     def runner(args: Union[str, List[str]] = None, **kwargs) -> RunResult:
         """
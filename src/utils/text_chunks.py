@@ -0,0 +1,55 @@
+import codecs
+import io
+from functools import partial
+from typing import BinaryIO, Iterator, Optional
+
+# How much of a file is inspected to decide whether it is text
+SNIFF_SIZE = 8192
+
+# Read size once a file has been accepted as text
+CHUNK_SIZE = 64 * 1024
+
+
+def looks_like_text(head: bytes, final: bool) -> bool:
+    """
+    Heuristic text check on the first bytes of a file: no NUL bytes and valid utf-8.
+
+    If `final` is False, `head` is only a prefix of the file, so a multi-byte sequence
+    cut off at the end is not treated as an error.
+    """
+    if b"\x00" in head:
+        return False
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=final)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def sniff_text_chunks(fb: BinaryIO) -> Optional[Iterator[str]]:
+    """
+    Inspect the head of the binary stream `fb` and return None if it looks binary.
+
+    Otherwise return an iterator of decoded, \\n-normalized text chunks for the whole
+    stream. This bounds the work spent on binary files to SNIFF_SIZE bytes and never
+    holds a whole text file in memory. Invalid utf-8 past the sniffed head decodes as
+    U+FFFD rather than aborting halfway through a file that is already being written out.
+    """
+    head = fb.read(SNIFF_SIZE)
+    if not looks_like_text(head, final=len(head) < SNIFF_SIZE):
+        return None
+
+    fb.seek(0)
+    return _iter_text_chunks(fb)
+
+
+def _iter_text_chunks(fb: BinaryIO) -> Iterator[str]:
+    # Default newline=None gives universal newlines: \r\n and \r become \n
+    text = io.TextIOWrapper(fb, encoding="utf-8", errors="replace")
+    try:
+        yield from iter(partial(text.read, CHUNK_SIZE), "")
+    finally:
+        # The caller owns fb; detach so the wrapper never tries to close it. (If the
+        # caller already closed fb, there is nothing left for the wrapper to close.)
+        if not fb.closed:
+            text.detach()